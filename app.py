@@ -2,10 +2,13 @@
 """Flask web app for processing and enriching company names."""
 
 import os
+import csv
+import json
 import threading
 import time
 import glob
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash
+from flask import (Flask, Response, render_template, request, jsonify, send_file, redirect,
+                   url_for, flash, stream_with_context)
 from werkzeug.utils import secure_filename
 import pandas as pd
 import normalize_companies as norm
@@ -25,10 +28,66 @@ progress_data = {
     'current_file': None
 }
 
+STATS_TTL = 1.0  # seconds; rapid /progress polls share one scan
+SSE_HEARTBEAT = 15  # seconds between keep-alive comments on idle streams
+
+# Bumped on every progress_data change; /progress/stream waits on it
+_progress_changed = threading.Condition()
+_progress_version = 0
+
+_rowcount_cache = {}
+_preview_cache = {}
+_stats_cache = {'scanned_at': 0.0, 'stats': None}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _fast_rowcount(path):
+    """Count data rows in a CSV without building a DataFrame; cached until the file changes.
+
+    Rows are counted with csv.reader so quoted fields spanning several lines
+    count once; blank lines are skipped as pandas does.
+    """
+    st = os.stat(path)
+    cached = _rowcount_cache.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    with open(path, encoding='utf-8', errors='replace', newline='') as fh:
+        rows = max(0, sum(1 for row in csv.reader(fh) if row) - 1)
+    _rowcount_cache[path] = (st.st_mtime_ns, st.st_size, rows)
+    return rows
+
+def _preview_records(path, nrows):
+    """First nrows of a CSV as records; cached until the file changes."""
+    st = os.stat(path)
+    cached = _preview_cache.get(path)
+    if cached is not None and cached[:3] == (st.st_mtime_ns, st.st_size, nrows):
+        return cached[3]
+    records = pd.read_csv(path, nrows=nrows).to_dict(orient='records')
+    _preview_cache[path] = (st.st_mtime_ns, st.st_size, nrows, records)
+    return records
+
+def notify_progress():
+    global _progress_version
+    with _progress_changed:
+        _progress_version += 1
+        _progress_changed.notify_all()
+
+def clear_stats_cache():
+    _stats_cache['stats'] = None
+    _rowcount_cache.clear()
+    _preview_cache.clear()
+
 def get_file_stats():
+    now = time.monotonic()
+    if _stats_cache['stats'] is not None and now - _stats_cache['scanned_at'] < STATS_TTL:
+        return _stats_cache['stats']
+    stats = _scan_file_stats()
+    _stats_cache['stats'] = stats
+    _stats_cache['scanned_at'] = now
+    return stats
+
+def _scan_file_stats():
     stats = {
         'normalized_file': None,
         'batch_count': 0,
@@ -39,10 +98,9 @@ def get_file_stats():
     normalized_file = os.path.join(norm.output_directory, 'minimal_normalized.csv')
     if os.path.exists(normalized_file):
         try:
-            df = pd.read_csv(normalized_file)
             stats['normalized_file'] = {
                 'path': normalized_file,
-                'rows': len(df),
+                'rows': _fast_rowcount(normalized_file),
                 'size': os.path.getsize(normalized_file)
             }
         except Exception:
@@ -52,7 +110,7 @@ def get_file_stats():
         batch_files = glob.glob(os.path.join(norm.batch_directory, 'batch_*.csv'))
         stats['batch_count'] = len(batch_files)
         try:
-            stats['total_representatives'] = sum(len(pd.read_csv(f)) for f in batch_files)
+            stats['total_representatives'] = sum(_fast_rowcount(f) for f in batch_files)
         except Exception:
             stats['total_representatives'] = 0
     
@@ -61,10 +119,9 @@ def get_file_stats():
         stats['enriched_files'] = []
         for f in enriched_files:
             try:
-                df = pd.read_csv(f)
                 stats['enriched_files'].append({
                     'name': os.path.basename(f),
-                    'rows': len(df),
+                    'rows': _fast_rowcount(f),
                     'size': os.path.getsize(f)
                 })
             except Exception:
@@ -73,17 +130,21 @@ def get_file_stats():
     return stats
 
 def run_normalization():
+    clear_stats_cache()
     progress_data['normalize']['status'] = 'running'
     progress_data['normalize']['progress'] = 0
     progress_data['normalize']['message'] = 'Starting normalization...'
-    
+    notify_progress()
+
     try:
-        for i in range(5):
-            time.sleep(1)
-            progress_data['normalize']['progress'] = (i + 1) * 20
-            progress_data['normalize']['message'] = f'Processing step {i + 1}/5...'
-        
-        norm.main()
+        # Stage boundaries reported by the normalization pipeline
+        def on_progress(percent, message):
+            # Clamp 0-99 until completion
+            progress_data['normalize']['progress'] = max(0, min(99, int(percent)))
+            progress_data['normalize']['message'] = message
+            notify_progress()
+
+        norm.main(progress_cb=on_progress)
         
         progress_data['normalize']['status'] = 'completed'
         progress_data['normalize']['progress'] = 100
@@ -93,11 +154,16 @@ def run_normalization():
         progress_data['normalize']['status'] = 'error'
         progress_data['normalize']['message'] = f'Error: {str(e)}'
 
+    clear_stats_cache()
+    notify_progress()
+
 def run_enrichment():
+    clear_stats_cache()
     progress_data['enrich']['status'] = 'running'
     progress_data['enrich']['progress'] = 0
     progress_data['enrich']['message'] = 'Starting website enrichment...'
-    
+    notify_progress()
+
     try:
         # Progress callback from enrichment
         def on_progress(current, total, message):
@@ -110,6 +176,7 @@ def run_enrichment():
                     # Unknown total: show indeterminate style by small increments
                     progress_data['enrich']['progress'] = min(95, progress_data['enrich']['progress'] + 1)
                 progress_data['enrich']['message'] = message
+                notify_progress()
             except Exception:
                 pass
 
@@ -127,6 +194,9 @@ def run_enrichment():
         progress_data['enrich']['status'] = 'error'
         progress_data['enrich']['message'] = f'Error: {str(e)}'
 
+    clear_stats_cache()
+    notify_progress()
+
 @app.route('/')
 def index():
     stats = get_file_stats()
@@ -138,12 +208,12 @@ def results():
     preview_rows = 50
     
     normalized_path = os.path.join(norm.output_directory, 'minimal_normalized.csv')
-    normalized_df = None
+    normalized_head = None
     if os.path.exists(normalized_path):
         try:
-            normalized_df = pd.read_csv(normalized_path, nrows=preview_rows)
+            normalized_head = _preview_records(normalized_path, preview_rows)
         except Exception:
-            normalized_df = None
+            normalized_head = None
 
     enriched_files = []
     if os.path.exists(enrich.OUTPUT_DIR):
@@ -153,19 +223,18 @@ def results():
     enriched_preview = []
     for fpath in enriched_files[:5]:
         try:
-            df = pd.read_csv(fpath, nrows=preview_rows)
             enriched_preview.append({
                 'name': os.path.basename(fpath),
-                'rows': len(pd.read_csv(fpath)),
+                'rows': _fast_rowcount(fpath),
                 'size': os.path.getsize(fpath),
-                'head': df.to_dict(orient='records')
+                'head': _preview_records(fpath, preview_rows)
             })
         except Exception:
             continue
 
     return render_template('results.html',
                            stats=stats,
-                           normalized_head=(normalized_df.to_dict(orient='records') if normalized_df is not None else None),
+                           normalized_head=normalized_head,
                            enriched_preview=enriched_preview)
 
 @app.route('/upload', methods=['POST'])
@@ -187,6 +256,7 @@ def upload_file():
         
         norm.input_path = filepath
         progress_data['current_file'] = filename
+        notify_progress()
         
         flash(f'File {filename} uploaded successfully!')
     else:
@@ -222,6 +292,25 @@ def get_progress():
         'stats': stats
     })
 
+@app.route('/progress/stream')
+def progress_stream():
+    def generate():
+        last_version = None
+        while True:
+            with _progress_changed:
+                if _progress_version == last_version:
+                    _progress_changed.wait(timeout=SSE_HEARTBEAT)
+                version = _progress_version
+            if version == last_version:
+                yield ': heartbeat\n\n'
+                continue
+            last_version = version
+            payload = json.dumps({'progress': progress_data, 'stats': get_file_stats()})
+            yield f'data: {payload}\n\n'
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/download/<file_type>')
 def download_file(file_type):
     if file_type == 'normalized':
@@ -240,6 +329,7 @@ def download_file(file_type):
 def reset_progress():
     progress_data['normalize'] = {'status': 'idle', 'progress': 0, 'message': 'Ready to start'}
     progress_data['enrich'] = {'status': 'idle', 'progress': 0, 'message': 'Ready to start'}
+    notify_progress()
     return redirect(url_for('index'))
 
 if __name__ == '__main__':
@@ -3,21 +3,52 @@
 
 import os
 import time
+import argparse
+import codecs
+import csv
+import glob
 import logging
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import diskcache
+import tldextract
 from ddgs import DDGS
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from rapidfuzz import fuzz
 import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family, create_connection
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 BATCH_DIR = "./enrichment_artifacts/batches"
 OUTPUT_DIR = "./enrichment_results"
+DONE_DB = os.path.join(OUTPUT_DIR, "done.sqlite")
+CACHE_DIR = "./enrichment_artifacts/http_cache"
+CACHE_EXPIRE = 7 * 86400  # seconds
+USE_CACHE = True
+TRANSIENT_STATUSES = {"http_403", "http_408", "http_429"}  # fetch outcomes never cached
 SEARCH_RESULTS = 5
 CONFIDENCE_THRESHOLD = 70
-SLEEP_BETWEEN_QUERIES = 0
+DOMAIN_MATCH_THRESHOLD = 90  # ratio of compacted name vs. domain to accept without fetching
+MAX_WORKERS = 16
+FETCH_WORKERS = 64
+WRITE_CHUNK_SIZE = 50
+MAX_PAGE_BYTES = 64 * 1024
+MAX_PAGE_TEXT = 2048  # characters of title/meta/h1 text kept for scoring
+FETCH_TIMEOUT = (3, 7)  # (connect, read) seconds
+DNS_CACHE_TTL = 60  # seconds
+DNS_CACHE_SIZE = 4096
+
+OUTPUT_FIELDS = ["representative", "website", "verified", "confidence_score", "fetch_status"]
 
 SKIP_DOMAINS = [
     "linkedin.com",
@@ -32,32 +63,168 @@ logging.basicConfig(level=logging.WARNING, format="%(levelname)s:%(message)s")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# DNS cache for the shared session: candidate sites are fetched from many
+# threads and the same hosts recur across names, so getaddrinfo results are
+# kept for DNS_CACHE_TTL seconds. Lookups still go through the system resolver
+# (hosts file, nsswitch, IPv6); failed lookups are not cached.
+_dns_cache = {}
+_dns_lock = threading.Lock()
+
+def _getaddrinfo_cached(host, port):
+    key = (host, port)
+    now = time.monotonic()
+    cached = _dns_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    infos = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+    with _dns_lock:
+        if len(_dns_cache) >= DNS_CACHE_SIZE:
+            _dns_cache.clear()
+        _dns_cache[key] = (now + DNS_CACHE_TTL, infos)
+    return infos
+
+class _CachedDNSMixin:
+    """Connect to the cached addresses of the host, trying each in turn.
+
+    Only the socket address comes from the cache; the Host header, SNI and
+    certificate checks still use the original host name.
+    """
+
+    def _new_conn(self):
+        try:
+            infos = _getaddrinfo_cached(self.host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+
+        err = NewConnectionError(self, "Failed to establish a new connection: no addresses")
+        for *_, sockaddr in infos:
+            try:
+                return create_connection(
+                    sockaddr[:2],
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options,
+                )
+            except socket.timeout:
+                err = ConnectTimeoutError(
+                    self,
+                    f"Connection to {self.host} timed out. (connect timeout={self.timeout})",
+                )
+            except OSError as e:
+                err = NewConnectionError(self, f"Failed to establish a new connection: {e}")
+        raise err
+
+class _CachedDNSHTTPConnection(_CachedDNSMixin, HTTPConnection):
+    pass
+
+class _CachedDNSHTTPSConnection(_CachedDNSMixin, HTTPSConnection):
+    pass
+
+class _CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CachedDNSHTTPConnection
+
+class _CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CachedDNSHTTPSConnection
+
+class CachedDNSAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections resolve hosts through the DNS cache."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CachedDNSHTTPConnectionPool,
+            "https": _CachedDNSHTTPSConnectionPool,
+        }
+
+# Shared HTTP session and a pool for homepage fetches, so the candidate pages
+# for a company are downloaded concurrently. Pages are usually read only in
+# part and their connections closed, so there is little keep-alive reuse and
+# the adapter keeps the default pool sizes.
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "Mozilla/5.0"})
+SESSION.verify = False
+_adapter = CachedDNSAdapter()
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+
+# Offline domain extraction from the bundled public suffix list snapshot
+DOMAIN_EXTRACT = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+# On-disk cache of search results and fetched pages so re-runs skip the network.
+# USE_CACHE=False bypasses lookups; fresh results are still written back.
+CACHE = diskcache.Cache(CACHE_DIR, size_limit=2 * 1024 ** 3)
+
+def search_company(name):
+    """Return search results for a company name, using the cache when enabled."""
+    key = f"ddg:{name}"
+    if USE_CACHE:
+        cached = CACHE.get(key)
+        if cached is not None:
+            return cached
+
+    with DDGS() as ddgs:
+        results = ddgs.text(f"{name} official site", max_results=SEARCH_RESULTS) or []
+    # An empty result list is usually a throttled search, so it is retried next run
+    if results:
+        CACHE.set(key, results, expire=CACHE_EXPIRE)
+    return results
+
 def fetch_homepage_text(url, retries=2, backoff=2):
-    """Fetch title, meta, and h1 text from homepage."""
+    """Fetch title, meta, and h1 text from homepage, using the cache when enabled."""
+    key = f"page:{url}"
+    if USE_CACHE:
+        cached = CACHE.get(key)
+        if cached is not None:
+            return cached
+
+    result = _fetch_homepage_text(url, retries=retries, backoff=backoff)
+    # Transient failures (errors, server errors, timeouts, rate limits and
+    # bot walls) are not cached so a re-run retries them
+    status = result[1]
+    if status != "failed" and not status.startswith("http_5") and status not in TRANSIENT_STATUSES:
+        CACHE.set(key, result, expire=CACHE_EXPIRE)
+    return result
+
+def _page_codec(encoding):
+    """Codec name for a response charset, falling back to utf-8 when unknown."""
+    try:
+        return codecs.lookup(encoding or "utf-8").name
+    except LookupError:
+        return "utf-8"
+
+def _fetch_homepage_text(url, retries=2, backoff=2):
     for attempt in range(retries):
         try:
-            resp = requests.get(
-                url, timeout=10, headers={"User-Agent": "Mozilla/5.0"}, verify=False
-            )
-            if resp.status_code == 200:
-                soup = BeautifulSoup(resp.text, "html.parser")
-                return (
-                    " ".join(
-                        filter(
-                            None,
-                            [
-                                soup.title.string if soup.title else "",
-                                " ".join(
-                                    m.get("content") or "" for m in soup.find_all("meta")
-                                ),
-                                " ".join(h.get_text() for h in soup.find_all("h1")),
-                            ],
-                        )
-                    ),
-                    "ok",
+            with SESSION.get(url, timeout=FETCH_TIMEOUT, stream=True) as resp:
+                if resp.status_code != 200:
+                    return "", f"http_{resp.status_code}"
+                # title/meta/h1 live in the head or first screen of the page,
+                # so stop reading once the first </h1> is seen or the cap is hit
+                buf = bytearray()
+                for chunk in resp.iter_content(8192):
+                    buf.extend(chunk)
+                    if b"</h1>" in buf[-(len(chunk) + 5):].lower() or len(buf) >= MAX_PAGE_BYTES:
+                        break
+                html = buf[:MAX_PAGE_BYTES].decode(_page_codec(resp.encoding), errors="replace")
+
+            tree = LexborHTMLParser(html)
+            title = tree.css_first("title")
+            text = " ".join(
+                filter(
+                    None,
+                    [
+                        title.text() if title else "",
+                        " ".join(
+                            m.attributes.get("content") or "" for m in tree.css("meta")
+                        ),
+                        " ".join(h.text() for h in tree.css("h1")),
+                    ],
                 )
-            else:
-                return "", f"http_{resp.status_code}"
+            )
+            # Scoring cost grows with text length; the leading text carries the signal
+            return text[:MAX_PAGE_TEXT], "ok"
         except (
             requests.exceptions.SSLError,
             requests.exceptions.ConnectionError,
@@ -70,34 +237,64 @@ def fetch_homepage_text(url, retries=2, backoff=2):
             break
     return "", "failed"
 
+def _domain_score(name_compact, url):
+    """Similarity of the whole name to the registered domain of url.
+
+    Both sides are compared without spaces or hyphens, so the domain has to
+    spell out the name rather than contain one of its words.
+    """
+    domain = DOMAIN_EXTRACT(url).domain.replace("-", "")
+    return fuzz.ratio(name_compact, domain) if domain else 0
+
 def enrich_company(name):
     """Enrich a single company by finding its website."""
     best_site, best_conf, verified = "", 0, "No"
     fetch_status = "not_fetched"
     
-    with DDGS() as ddgs:
-        for r in ddgs.text(f"{name} official site", max_results=SEARCH_RESULTS):
+    results = search_company(name)
+
+    # Skip unwanted domains
+    candidates = [
+        r for r in results if not any(dom in r.get("href", "") for dom in SKIP_DOMAINS)
+    ]
+
+    name_lower = name.lower()
+
+    # The best result whose domain already spells out the name is accepted
+    # with its domain score; pages are only fetched when no domain matches
+    name_compact = name_lower.replace(" ", "").replace("-", "")
+    domain_match, domain_conf = None, 0
+    for r in candidates:
+        score = _domain_score(name_compact, r.get("href", ""))
+        if score > domain_conf:
+            domain_match, domain_conf = r, score
+
+    if domain_conf >= DOMAIN_MATCH_THRESHOLD:
+        best_site = domain_match.get("href", "")
+        best_conf = domain_conf
+        fetch_status = "domain_match"
+    else:
+        # Fetch all candidate pages concurrently
+        pages = FETCH_EXECUTOR.map(fetch_homepage_text, [r.get("href", "") for r in candidates])
+
+        for r, (page_text, status) in zip(candidates, pages):
             url = r.get("href", "")
             title = r.get("title", "")
             snippet = r.get("body", "")
-            
-            # Skip unwanted domains
-            if any(dom in url for dom in SKIP_DOMAINS):
-                continue
-                
-            # Fetch and analyze page content
-            page_text, status = fetch_homepage_text(url)
             fetch_status = status
-            
-            # Calculate confidence score
+
+            # Calculate confidence score; candidates that cannot beat the current
+            # best are cut off early and score 0
             score = fuzz.token_set_ratio(
-                name.lower(), (title + " " + page_text + " " + snippet).lower()
+                name_lower,
+                (title + " " + page_text + " " + snippet).lower(),
+                score_cutoff=best_conf,
             )
-            
+
             if score > best_conf:
                 best_conf = score
                 best_site = url
-    
+
     # Determine if verification is successful
     if best_conf >= CONFIDENCE_THRESHOLD:
         verified = "Yes"
@@ -116,41 +313,83 @@ def process_batch(batch_file, on_progress=None, progress_state=None):
     on_progress: Optional callable accepting (current, total, message)
     progress_state: Optional dict with keys {"current": int, "total": int}
     """
-    batch_name = os.path.basename(batch_file).replace(".csv", "")
-    out_file = os.path.join(OUTPUT_DIR, f"{batch_name}_enriched.csv")
-
-    # Resume if file exists
-    processed = set()
-    if os.path.exists(out_file):
-        try:
-            old = pd.read_csv(out_file)
-            processed = set(old["representative"].tolist())
-        except Exception:
-            pass
-
     try:
-        df = pd.read_csv(batch_file)
+        names = _read_batch_names(batch_file)
     except Exception as e:
         print(f"Error reading batch file {batch_file}: {e}")
         return
 
-    with open(out_file, "a", encoding="utf-8", newline="") as f:
-        for i, row in df.iterrows():
-            name = (
-                row["representative_name"]
-                if "representative_name" in row
-                else row.get("representative", "")
+    _enrich_batches({batch_file: names}, on_progress, progress_state)
+
+def _enrich_batches(batch_names, on_progress=None, progress_state=None):
+    """Enrich the names of several batches, appending rows to each batch's output.
+
+    batch_names: dict mapping batch file -> list of names
+    """
+    # Resume: skip names already enriched by any batch, and drop rows a crashed
+    # run appended after its last commit (their names were not marked done)
+    con = _open_done_db()
+    outputs = {}
+    tasks = []
+    for batch_file, names in batch_names.items():
+        batch_name = os.path.basename(batch_file).replace(".csv", "")
+        out_file = os.path.join(OUTPUT_DIR, f"{batch_name}_enriched.csv")
+        committed = _committed_size(con, out_file)
+        if os.path.exists(out_file) and os.path.getsize(out_file) > committed:
+            with open(out_file, "r+b") as fh:
+                fh.truncate(committed)
+        outputs[batch_name] = out_file
+        tasks.extend((batch_name, name) for name in names if not _is_done(con, name))
+
+    # Enrichment is network-bound: one pool of worker threads runs
+    # enrich_company (each with its own DDGS instance) over the names of all
+    # batches, so every worker stays busy until the last name is done, while
+    # this thread collects results as they finish and appends them to their
+    # batch's output file, flushing every WRITE_CHUNK_SIZE rows. Names are
+    # marked done only once their rows have been flushed.
+    files = {}
+    written = []
+
+    def flush():
+        for batch_name, (f, _) in files.items():
+            f.flush()
+            con.execute(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?)",
+                (os.path.basename(outputs[batch_name]), f.tell()),
             )
-            
-            if not isinstance(name, str) or not name:
-                continue
-            if name in processed:
+        con.executemany(
+            "INSERT OR IGNORE INTO done VALUES (?, ?)",
+            ((name, os.path.basename(outputs[batch_name])) for batch_name, name in written),
+        )
+        con.commit()
+        written.clear()
+
+    with ExitStack() as stack:
+        for batch_name, out_file in outputs.items():
+            f = stack.enter_context(open(out_file, "a", encoding="utf-8", newline=""))
+            writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+            if f.tell() == 0:
+                writer.writeheader()
+            files[batch_name] = (f, writer)
+
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers=MAX_WORKERS))
+        futures = {
+            executor.submit(enrich_company, name): (batch_name, name) for batch_name, name in tasks
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            batch_name, name = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                logging.warning(f"[{batch_name}] Failed to enrich {name}: {e}")
                 continue
-                
-            print(f"[{batch_name}] Processing {i+1}/{len(df)}: {name}")
-            record = enrich_company(name)
-            pd.DataFrame([record]).to_csv(f, header=(f.tell() == 0), index=False)
-            time.sleep(SLEEP_BETWEEN_QUERIES)
+
+            print(f"[{batch_name}] Processed {done}/{len(tasks)}: {name}")
+            files[batch_name][1].writerow(record)
+            written.append((batch_name, name))
+            if done % WRITE_CHUNK_SIZE == 0:
+                flush()
+
             if progress_state is not None:
                 progress_state["current"] += 1
                 if on_progress is not None:
@@ -163,31 +402,95 @@ def process_batch(batch_file, on_progress=None, progress_state=None):
                     except Exception:
                         pass
 
-def _compute_total_tasks(batch_files):
-    total = 0
-    for batch_file in batch_files:
-        try:
-            batch_name = os.path.basename(batch_file).replace(".csv", "")
-            out_file = os.path.join(OUTPUT_DIR, f"{batch_name}_enriched.csv")
-            df = pd.read_csv(batch_file)
-            processed = set()
-            if os.path.exists(out_file):
-                try:
-                    old = pd.read_csv(out_file)
-                    processed = set(old["representative"].tolist())
-                except Exception:
-                    processed = set()
-            remaining = 0
-            for _, row in df.iterrows():
-                name = (
-                    row.get("representative_name", row.get("representative", ""))
-                )
-                if isinstance(name, str) and name and name not in processed:
-                    remaining += 1
-            total += remaining
-        except Exception:
+        flush()
+    con.close()
+
+def _open_done_db():
+    """Open the table of enriched names, kept in step with the output files.
+
+    Each name is stored with the output file holding its row, and each output
+    file with its length when its names were last committed. Names whose file
+    was deleted or shrunk are forgotten, and output files not yet tracked are
+    read once to seed the table.
+    """
+    con = sqlite3.connect(DONE_DB, timeout=30)
+    columns = [row[1] for row in con.execute("PRAGMA table_info(done)")]
+    if columns and "out_file" not in columns:
+        con.execute("DROP TABLE done")
+    con.execute("CREATE TABLE IF NOT EXISTS done(name TEXT PRIMARY KEY, out_file TEXT)")
+    con.execute("CREATE TABLE IF NOT EXISTS outputs(out_file TEXT PRIMARY KEY, size INTEGER)")
+
+    tracked = dict(con.execute("SELECT out_file, size FROM outputs"))
+    for out_file, size in list(tracked.items()):
+        path = os.path.join(OUTPUT_DIR, out_file)
+        if not os.path.exists(path) or os.path.getsize(path) < size:
+            con.execute("DELETE FROM done WHERE out_file = ?", (out_file,))
+            con.execute("DELETE FROM outputs WHERE out_file = ?", (out_file,))
+            tracked.pop(out_file)
+
+    for path in glob.glob(os.path.join(OUTPUT_DIR, "*_enriched.csv")):
+        out_file = os.path.basename(path)
+        if out_file in tracked:
             continue
-    return total
+        con.executemany(
+            "INSERT OR IGNORE INTO done VALUES (?, ?)",
+            ((name, out_file) for name in _read_processed(path)),
+        )
+        con.execute("INSERT INTO outputs VALUES (?, ?)", (out_file, os.path.getsize(path)))
+    con.commit()
+    return con
+
+def _committed_size(con, out_file):
+    row = con.execute(
+        "SELECT size FROM outputs WHERE out_file = ?", (os.path.basename(out_file),)
+    ).fetchone()
+    return row[0] if row else 0
+
+def _is_done(con, name):
+    return con.execute("SELECT 1 FROM done WHERE name = ?", (name,)).fetchone() is not None
+
+def _read_processed(out_file):
+    """Names already written to an enriched output file."""
+    if not os.path.exists(out_file):
+        return set()
+    try:
+        return set(pd.read_csv(out_file, usecols=["representative"])["representative"].dropna())
+    except Exception:
+        return set()
+
+def _read_batch_names(batch_file):
+    """Unique, non-empty company names of a batch file, in file order."""
+    df = pd.read_csv(
+        batch_file, usecols=lambda c: c in ("representative_name", "representative")
+    )
+    column = "representative_name" if "representative_name" in df else "representative"
+    if column not in df:
+        return []
+    return [name for name in df[column].dropna().unique() if isinstance(name, str) and name]
+
+def _assign_batch_names(batch_files):
+    """Map each batch file to its pending names, giving every name to one batch only.
+
+    A name shared by several batches goes to the first of them; names already
+    enriched are left out.
+    """
+    assigned = {}
+    seen = set()
+    con = _open_done_db()
+    try:
+        for batch_file in batch_files:
+            try:
+                names = _read_batch_names(batch_file)
+            except Exception as e:
+                print(f"Error reading batch file {batch_file}: {e}")
+                continue
+            pending = [name for name in names if name not in seen and not _is_done(con, name)]
+            seen.update(names)
+            if pending:
+                assigned[batch_file] = pending
+    finally:
+        con.close()
+    return assigned
 
 def run_with_progress(on_progress):
     """Run enrichment reporting progress via callback on_progress(current, total, message)."""
@@ -211,16 +514,16 @@ def run_with_progress(on_progress):
             on_progress(0, 0, msg)
         return
 
-    total = _compute_total_tasks(batch_files)
-    state = {"current": 0, "total": total}
+    assigned = _assign_batch_names(batch_files)
+    total = sum(len(names) for names in assigned.values())
+    progress_state = {"current": 0, "total": total}
 
-    for batch_file in batch_files:
-        print(f"\nStarting batch: {batch_file}")
-        process_batch(batch_file, on_progress=on_progress, progress_state=state)
-        print(f"Finished batch: {batch_file}")
+    # All batches share one pool of MAX_WORKERS search threads; each name is
+    # enriched once, in the first batch that lists it
+    _enrich_batches(assigned, on_progress, progress_state)
 
     if on_progress:
-        on_progress(state["current"], total, "Website enrichment completed successfully!")
+        on_progress(progress_state["current"], total, "Website enrichment completed successfully!")
 
 def main():
     """Main enrichment process."""
@@ -247,4 +550,13 @@ def main():
     print("Website enrichment completed successfully!")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="ignore cached search results and pages (fresh results are still cached)",
+    )
+    args = parser.parse_args()
+    if args.no_cache:
+        USE_CACHE = False
     main()
\ No newline at end of file
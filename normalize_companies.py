@@ -3,12 +3,11 @@
 
 import re
 import unicodedata
-import math
 import os
-from multiprocessing import Pool, cpu_count
-from collections import defaultdict, Counter
-import difflib
+from collections import defaultdict
+import numpy as np
 import pandas as pd
+from rapidfuzz import process, fuzz
 
 stopwords = set(["ltd", "limited", "inc", "llc", "corp", "corporation"])
 abbreviations = {
@@ -21,6 +20,7 @@ abbreviations = {
 }
 remove_prefixes = ["guangzhou"]
 fuzzy_threshold = 0.9
+cluster_chunk_size = 2000
 
 input_URL = "https://drive.google.com/file/d/1g5-2W6SgD3n9S03qEucTU3gf_Mvv5A84/view?usp=sharing"
 input_path = "https://drive.google.com/uc?export=download&id=" + input_URL.split("/")[-2]
@@ -36,6 +36,27 @@ except ImportError:
     def transliterate(text):
         return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
 
+# Patterns are built once at import time and shared by the scalar and
+# vectorized normalization paths.
+# Abbreviations are expanded one after another, in dict order, so an
+# expansion can change the word boundaries seen by the next one.
+_ABBR_RES = [
+    (re.compile(r"\b" + re.escape(key.lower()) + r"\b"), value.lower())
+    for key, value in abbreviations.items()
+]
+_PREFIX_RE = re.compile(
+    r"^(?:" + "|".join(map(re.escape, (prefix.lower() for prefix in remove_prefixes))) + r") "
+)
+_PUNC_AMP = re.compile(r"[&@/\\]+")
+_PUNC_KEEP = re.compile(r"[^A-Za-z0-9\s\-]")
+_WS = re.compile(r"\s+")
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = pacsv = None
+
 def clean_unicode(text: str) -> str:
     """Clean and normalize unicode text."""
     if not isinstance(text, str):
@@ -50,9 +71,9 @@ def clean_unicode(text: str) -> str:
 
 def perform_basic_cleaning(text: str) -> str:
     """Remove punctuation, keep words intact."""
-    text = re.sub(r"[&@/\\]+", " and ", text)
-    text = re.sub(r"[^A-Za-z0-9\s\-]", " ", text)
-    text = re.sub(r"\s+", " ", text)
+    text = _PUNC_AMP.sub(" and ", text)
+    text = _PUNC_KEEP.sub(" ", text)
+    text = _WS.sub(" ", text)
     return text.strip()
 
 def apply_light_normalization(raw_name: str) -> str:
@@ -60,61 +81,122 @@ def apply_light_normalization(raw_name: str) -> str:
     raw_name = "" if raw_name is None else str(raw_name)
     cleaned = clean_unicode(raw_name).lower()
 
-    # Expand abbreviations
-    for abbr_key, abbr_value in abbreviations.items():
-        abbr_key_lower = abbr_key.lower()
-        abbr_value_lower = abbr_value.lower()
-        cleaned = re.sub(r"\b" + re.escape(abbr_key_lower) + r"\b", abbr_value_lower, cleaned)
-
-    # Remove prefixes if configured
-    for prefix in remove_prefixes:
-        prefix_lower = prefix.lower()
-        if cleaned.startswith(prefix_lower + " "):
-            cleaned = cleaned[len(prefix_lower) + 1:].strip()
-            break
-
-    cleaned = perform_basic_cleaning(cleaned)
-    return cleaned
+    for abbr_re, expansion in _ABBR_RES:
+        cleaned = abbr_re.sub(expansion, cleaned)
+    cleaned = _PREFIX_RE.sub("", cleaned)
+    return perform_basic_cleaning(cleaned)
 
-def apply_heavy_normalization(raw_name: str) -> str:
-    """Aggressive cleanup for clustering."""
-    light_normalized = apply_light_normalization(raw_name)
+def heavy_from_light(light_normalized: str) -> str:
+    """Build the clustering key from an already light-normalized name."""
     tokens = [
         token
-        for token in re.split(r"\s+", light_normalized)
+        for token in _WS.split(light_normalized)
         if token and token not in stopwords
     ]
-    tokens = list(set(tokens))  # Remove duplicates
+    tokens = list(dict.fromkeys(tokens))  # Remove duplicates, keep word order
     return " ".join(tokens)
 
-def process_data_chunk(chunk: pd.DataFrame, column_name: str):
-    """Process a chunk of data for normalization."""
-    records = []
-    for _, row in chunk.iterrows():
-        raw_name = row[column_name]
-        light_normalized = apply_light_normalization(raw_name)
-        heavy_normalized = apply_heavy_normalization(raw_name)
-        records.append({
-            "raw_name": raw_name,
-            "normalized_light": light_normalized,
-            "normalized_heavy": heavy_normalized,
-        })
-    return records
-
-def main():
-    """Run normalization pipeline."""
-    print("Starting company name normalization...")
+def apply_heavy_normalization(raw_name: str) -> str:
+    """Aggressive cleanup for clustering."""
+    return heavy_from_light(apply_light_normalization(raw_name))
+
+def normalize_light_series(names: pd.Series) -> pd.Series:
+    """Vectorized equivalent of apply_light_normalization for a whole column."""
+    cleaned = names.fillna("").astype(str).str.strip().str.normalize("NFKC")
+    cleaned = cleaned.map(transliterate).str.lower()
+
+    for abbr_re, expansion in _ABBR_RES:
+        cleaned = cleaned.str.replace(abbr_re, expansion, regex=True)
+    cleaned = cleaned.str.replace(_PREFIX_RE, "", regex=True)
+    cleaned = cleaned.str.replace(_PUNC_AMP, " and ", regex=True)
+    cleaned = cleaned.str.replace(_PUNC_KEEP, " ", regex=True)
+    cleaned = cleaned.str.replace(_WS, " ", regex=True)
+    return cleaned.str.strip()
+
+def cluster_fuzzy_names(heavy_names) -> dict:
+    """Map each heavy-normalized name to the key of its fuzzy cluster.
+
+    Names are blocked on their leading word and compared pairwise with
+    rapidfuzz inside each block; pairs scoring at least fuzzy_threshold are
+    merged with union-find. The key of a cluster is its smallest member.
+    """
+    unique_names = sorted(set(heavy_names))
+    parent = list(range(len(unique_names)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    blocks = defaultdict(list)
+    for index, heavy in enumerate(unique_names):
+        blocks[heavy.split(" ", 1)[0]].append(index)
+
+    score_cutoff = round(fuzzy_threshold * 100)
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        names = [unique_names[i] for i in members]
+        # Bound the score matrix to cluster_chunk_size rows at a time
+        for start in range(0, len(names), cluster_chunk_size):
+            scores = process.cdist(
+                names[start:start + cluster_chunk_size],
+                names,
+                scorer=fuzz.ratio,
+                score_cutoff=score_cutoff,
+                dtype=np.uint8,
+                workers=-1,
+            )
+            for row, col in zip(*np.nonzero(scores)):
+                root_a, root_b = find(members[start + row]), find(members[col])
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return {heavy: unique_names[find(index)] for index, heavy in enumerate(unique_names)}
+
+def read_input_csv(path: str, encoding: str) -> pd.DataFrame:
+    """Read the input CSV as strings, loading only the name column when possible."""
+    if pacsv is None or not os.path.isfile(path):
+        # Remote inputs (e.g. the default Drive URL) go through pandas
+        return pd.read_csv(path, dtype=str, keep_default_na=False, encoding=encoding)
+
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=8 << 20, encoding=encoding)
+    with pacsv.open_csv(path, read_options=read_options) as reader:
+        name_column = reader.schema.names[0]
+    table = pacsv.read_csv(
+        path,
+        read_options=read_options,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[name_column],
+            column_types={name_column: pa.string()},
+            strings_can_be_null=False,
+        ),
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def main(progress_cb=None):
+    """Run normalization pipeline.
+
+    progress_cb: Optional callable accepting (percent, message), called at
+    each stage boundary.
+    """
+    def report(percent, message):
+        print(message)
+        if progress_cb is not None:
+            try:
+                progress_cb(percent, message)
+            except Exception:
+                pass
+
+    report(0, "Starting company name normalization...")
     
     # Read input data
     try:
-        input_dataframe = pd.read_csv(
-            input_path, dtype=str, keep_default_na=False, encoding="utf-8"
-        )
+        input_dataframe = read_input_csv(input_path, encoding="utf-8")
     except Exception:
         try:
-            input_dataframe = pd.read_csv(
-                input_path, dtype=str, keep_default_na=False, encoding="latin1"
-            )
+            input_dataframe = read_input_csv(input_path, encoding="latin1")
         except Exception as e:
             print(f"Error reading input file: {e}")
             return
@@ -128,29 +210,20 @@ def main():
         input_dataframe = input_dataframe.head(row_limit)
 
     original_shape = input_dataframe.shape
-    print(f"Input shape: {original_shape} (rows, cols) | Using column '{name_column}'")
-
-    # Step 1: Normalize in parallel
-    print("Normalizing company names...")
-    number_of_cores = cpu_count()
-    chunk_size = math.ceil(len(input_dataframe) / number_of_cores)
-    chunks = [
-        input_dataframe.iloc[
-            i * chunk_size : min((i + 1) * chunk_size, len(input_dataframe))
-        ]
-        for i in range(number_of_cores)
-    ]
-    
-    with Pool(number_of_cores) as pool:
-        all_records = pool.starmap(
-            process_data_chunk, [(chunk, name_column) for chunk in chunks if not chunk.empty]
-        )
-    
-    records = [record for chunk_records in all_records for record in chunk_records]
-    normalized_dataframe = pd.DataFrame(records)
+    report(5, f"Input shape: {original_shape} (rows, cols) | Using column '{name_column}'")
+
+    # Step 1: Normalize (vectorized over the whole column)
+    report(10, "Normalizing company names...")
+    raw_names = input_dataframe[name_column]
+    light_normalized = normalize_light_series(raw_names)
+    normalized_dataframe = pd.DataFrame({
+        "raw_name": raw_names,
+        "normalized_light": light_normalized,
+        "normalized_heavy": light_normalized.map(heavy_from_light),
+    })
 
     # Step 2: Clean and deduplicate
-    print("Cleaning and deduplicating...")
+    report(30, "Cleaning and deduplicating...")
     rows_before_cleaning = normalized_dataframe.shape[0]
     normalized_dataframe = normalized_dataframe[
         normalized_dataframe["normalized_light"].str.strip() != ""
@@ -165,45 +238,25 @@ def main():
     print(f"Deleted rows: {deleted_rows}")
 
     # Step 3: Fuzzy clustering
-    print("Performing fuzzy clustering...")
-    unique_heavy_normalized = sorted(normalized_dataframe["normalized_heavy"].unique())
-    fuzzy_groups = []
-    
-    if unique_heavy_normalized:
-        current_group = [unique_heavy_normalized[0]]
-        for heavy in unique_heavy_normalized[1:]:
-            last_heavy = current_group[-1]
-            similarity = difflib.SequenceMatcher(None, last_heavy, heavy).quick_ratio()
-            if similarity >= fuzzy_threshold:
-                current_group.append(heavy)
-            else:
-                fuzzy_groups.append(current_group)
-                current_group = [heavy]
-        fuzzy_groups.append(current_group)
-
-    # Create fuzzy mapping
-    heavy_to_fuzzy_map = {}
-    for group in fuzzy_groups:
-        key = group[0]
-        for heavy in group:
-            heavy_to_fuzzy_map[heavy] = key
+    report(40, "Performing fuzzy clustering...")
+    heavy_to_fuzzy_map = cluster_fuzzy_names(normalized_dataframe["normalized_heavy"])
 
     normalized_dataframe["fuzzy_heavy"] = normalized_dataframe["normalized_heavy"].map(
         heavy_to_fuzzy_map
     )
 
     # Step 4: Create clusters and representatives
-    print("Creating clusters and representatives...")
-    clusters = defaultdict(list)
-    for record in normalized_dataframe.to_dict(orient="records"):
-        clusters[record["fuzzy_heavy"]].append(record)
-
-    representatives = {}
-    for fingerprint, members in clusters.items():
-        most_common_normalized = Counter(
-            [member["normalized_light"] for member in members]
-        ).most_common(1)[0][0]
-        representatives[fingerprint] = most_common_normalized
+    report(60, "Creating clusters and representatives...")
+    # Most common light name per cluster; ties go to the first one seen
+    member_counts = normalized_dataframe.groupby(
+        ["fuzzy_heavy", "normalized_light"], sort=False
+    ).size()
+    representatives = (
+        member_counts.sort_values(ascending=False, kind="stable")
+        .reset_index()
+        .drop_duplicates(subset=["fuzzy_heavy"])
+        .set_index("fuzzy_heavy")["normalized_light"]
+    )
 
     # Step 5: Add metadata columns
     normalized_dataframe["representative_name"] = normalized_dataframe["fuzzy_heavy"].map(
@@ -218,7 +271,7 @@ def main():
     )
 
     # Step 6: Save normalized file
-    print("Saving normalized data...")
+    report(70, "Saving normalized data...")
     output_file = os.path.join(output_directory, "minimal_normalized.csv")
     if not is_dry_run:
         try:
@@ -231,7 +284,7 @@ def main():
         print(f"Would save -> {output_file} ({len(normalized_dataframe)} rows)")
 
     # Step 7: Create batch files
-    print("Creating batch files...")
+    report(85, "Creating batch files...")
     representatives_dataframe = normalized_dataframe.drop_duplicates(
         subset=["fuzzy_heavy"]
     )[
@@ -272,7 +325,7 @@ def main():
         else:
             print(f"Would save batch {batch_index + 1}/{number_of_batches} -> {batch_file} ({len(batch_data)} reps)")
 
-    print("Normalization completed successfully!")
+    report(100, "Normalization completed successfully!")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file